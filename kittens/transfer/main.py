@@ -56,6 +56,16 @@ def option_text() -> str:
 update it to match the file on the sending side, potentially saving lots of
 bandwidth and also automatically resuming partial transfers. Note that this will
 actually degrade performance on fast links with small files, so use with care.
+
+
+--compression-level
+type=int
+default=1
+The zlib compression level (0-9) to use for files that are compressed during
+transmission. Higher levels produce slightly smaller data at the cost of a lot
+more CPU time, which is rarely worth it for transfers over a TTY. A level of
+:code:`0` disables compression. Only used when sending files, when receiving,
+the compression is done by the terminal.
 '''
 
 
@@ -87,6 +97,8 @@ def main(args: List[str]) -> None:
     if cli_opts.permissions_bypass:
         cli_opts.permissions_bypass = read_bypass(cli_opts.permissions_bypass).strip()
 
+    if not 0 <= cli_opts.compression_level <= 9:
+        raise SystemExit('The compression level must be between 0 and 9')
     if not items:
         raise SystemExit('Usage: kitty +kitten transfer file_or_directory ...')
     if cli_opts.direction == 'send':
@@ -208,22 +208,22 @@ def change_active_file(self, nf: File) -> None:
         nf.transmit_started_at = now
 
     def start_transfer(self) -> None:
-        self.transfers.append(Transfer())
         self.started_at = monotonic()
+        self.transfers.append(Transfer(0, self.started_at))
 
     def file_written(self, af: File, amt: int, is_done: bool) -> None:
         if self.active_file is not af:
             self.change_active_file(af)
         af.written_bytes += amt
         self.total_transferred += amt
-        self.transfers.append(Transfer(amt))
-        now = self.transfers[-1].at
+        now = monotonic()
+        self.transfers.append(Transfer(amt, now))
+        self.transfered_stats_amt += amt
         while len(self.transfers) > 2 and self.transfers[0].is_too_old(now):
-            self.transfers.popleft()
+            self.transfered_stats_amt -= self.transfers.popleft().amt
         self.transfered_stats_interval = now - self.transfers[0].at
-        self.transfered_stats_amt = sum(t.amt for t in self.transfers)
         if is_done:
-            af.done_at = monotonic()
+            af.done_at = now
             self.done_files.append(af)
 
 
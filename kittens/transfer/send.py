@@ -4,16 +4,27 @@
 
 import os
 import stat
-from asyncio import TimerHandle
+from asyncio import Future, TimerHandle
+from base64 import standard_b64encode
 from collections import deque
 from enum import auto
-from itertools import count
+from io import FileIO
+from itertools import chain, count, islice
 from time import monotonic
-from typing import IO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 from kitty.cli_stub import TransferCLIOptions
 from kitty.fast_data_types import FILE_TRANSFER_CODE, wcswidth
-from kitty.file_transmission import Action, Compression, FileTransmissionCommand, FileType, NameReprEnum, TransmissionType, encode_bypass, split_for_transfer
+from kitty.file_transmission import (
+    Action,
+    Compression,
+    FileTransmissionCommand,
+    FileType,
+    NameReprEnum,
+    TransmissionType,
+    encode_bypass,
+    name_to_serialized_map,
+)
 from kitty.typing import KeyEventType, ScreenSize
 from kitty.utils import sanitize_control_codes
 
@@ -25,9 +36,11 @@
 from .librsync import LoadSignature, delta_for_file
 from .utils import (
     IdentityCompressor,
+    LibdeflateCompressor,
     ZlibCompressor,
     abspath,
     expand_home,
+    has_libdeflate,
     home_path,
     print_rsync_stats,
     random_id,
@@ -37,11 +50,21 @@
 )
 
 debug
+CHUNK_SIZE = 4 * 1024 * 1024
+# The protocol limits the payload of a single data command to 4096 bytes.
+# Chunks are base64 encoded in one go and the result is split on 4 character
+# boundaries, so that every frame decodes independently to at most 4095 bytes.
+FRAME_SIZE = 4096
+ENCODED_FRAME_SIZE = FRAME_SIZE // 3 * 4
+SCAN_BATCH_SIZE = 512
+# Remote paths always use / as the separator, no conversion is needed when the
+# local separator is already /
+NEEDS_SEP_NORMALIZATION = os.sep != '/'
 
 
 def get_remote_path(local_path: str, remote_base: str) -> str:
     if not remote_base:
-        return local_path.replace(os.sep, '/')
+        return local_path.replace(os.sep, '/') if NEEDS_SEP_NORMALIZATION else local_path
     if remote_base.endswith('/'):
         return os.path.join(remote_base, os.path.basename(local_path))
     return remote_base
@@ -57,6 +80,15 @@ class FileState(NameReprEnum):
 
 class File:
 
+    __slots__ = (
+        'state', 'local_path', 'display_name', 'display_name_width', 'expanded_local_path', 'permissions', 'mtime',
+        'file_size', 'bytes_to_transmit', 'file_hash', 'remote_path', 'file_id', 'hard_link_target', 'symbolic_link_target',
+        'file_type', 'rsync_capable', 'compression_capable', 'remote_final_path', 'remote_initial_size', 'err_msg',
+        'actual_file', 'bytes_read', 'transmitted_bytes', 'reported_progress', 'transmit_started_at', 'transmit_ended_at',
+        'done_at', 'signature_loader', 'delta_loader', 'ttype', 'compression', 'compressor', 'data_frame_prefix',
+        'end_frame_prefix', 'read_buf',
+    )
+
     def __init__(
         self, local_path: str, expanded_local_path: str, file_id: int, stat_result: os.stat_result,
         remote_base: str, file_type: FileType,
@@ -64,48 +96,55 @@ def __init__(
         self.state = FileState.waiting_for_start
         self.local_path = local_path
         self.display_name = sanitize_control_codes(local_path)
+        self.display_name_width = wcswidth(self.display_name)
         self.expanded_local_path = expanded_local_path
         self.permissions = stat.S_IMODE(stat_result.st_mode)
         self.mtime = stat_result.st_mtime_ns
         self.file_size = self.bytes_to_transmit = stat_result.st_size
         self.file_hash = stat_result.st_dev, stat_result.st_ino
         self.remote_path = get_remote_path(self.local_path, remote_base)
-        self.remote_path = self.remote_path.replace(os.sep, '/')
+        if NEEDS_SEP_NORMALIZATION:
+            self.remote_path = self.remote_path.replace(os.sep, '/')
         self.file_id = hex(file_id)[2:]
         self.hard_link_target = ''
         self.symbolic_link_target = ''
-        self.stat_result = stat_result
         self.file_type = file_type
         self.rsync_capable = self.file_type is FileType.regular and self.file_size > 4096
         self.compression_capable = self.file_type is FileType.regular and self.file_size > 4096 and should_be_compressed(self.expanded_local_path)
         self.remote_final_path = ''
         self.remote_initial_size = -1
         self.err_msg = ''
-        self.actual_file: Optional[IO[bytes]] = None
+        self.actual_file: Optional[FileIO] = None
+        self.read_buf: Optional[bytearray] = None
+        self.bytes_read = 0
         self.transmitted_bytes = 0
         self.reported_progress = 0
         self.transmit_started_at = self.transmit_ended_at = self.done_at = 0.
         self.signature_loader: Optional[LoadSignature] = None
         self.delta_loader: Optional[Iterator[memoryview]] = None
+        self.ttype = TransmissionType.simple
+        self.compression = Compression.none
+        self.compressor: Union[ZlibCompressor, LibdeflateCompressor, IdentityCompressor] = IdentityCompressor()
+        self.data_frame_prefix = self.end_frame_prefix = ''
 
     def start_delta_calculation(self) -> None:
         sl = self.signature_loader
         assert sl is not None
-        self.state = FileState.transmitting
         self.delta_loader = delta_for_file(self.expanded_local_path, sl.signature)
 
     def __repr__(self) -> str:
         return f'File(name={self.display_name}, ft={self.file_type}, state={self.state})'
 
-    def next_chunk(self, sz: int = 1024 * 1024) -> Tuple[bytes, int]:
+    def next_chunk(self, sz: int = CHUNK_SIZE) -> Tuple[Union[bytes, memoryview], int, bool]:
+        # Does not change self.state so that it can be called in a worker thread.
+        # The returned chunk can be a view into self.read_buf and so is only
+        # valid until the next call.
         if self.file_type is FileType.symlink:
-            self.state = FileState.finished
             ans = self.symbolic_link_target.encode('utf-8')
-            return ans, len(ans)
+            return ans, len(ans), True
         if self.file_type is FileType.link:
-            self.state = FileState.finished
             ans = self.hard_link_target.encode('utf-8')
-            return ans, len(ans)
+            return ans, len(ans), True
         is_last = False
         if self.delta_loader is not None:
             try:
@@ -116,24 +155,40 @@ def next_chunk(self, sz: int = 1024 * 1024) -> Tuple[bytes, int]:
                 chunk = b''
         else:
             if self.actual_file is None:
-                self.actual_file = open(self.expanded_local_path, 'rb')
-            chunk = self.actual_file.read(sz)
-            is_last = not chunk or self.actual_file.tell() >= self.file_size
+                self.actual_file = open(self.expanded_local_path, 'rb', buffering=0)
+                self.expanded_local_path = ''  # no longer needed
+            if self.read_buf is None:
+                self.read_buf = bytearray(max(1, min(sz, self.file_size)))
+            n = self.actual_file.readinto(self.read_buf) or 0
+            chunk = memoryview(self.read_buf)[:n]
+            self.bytes_read += n
+            is_last = not n or self.bytes_read >= self.file_size
         uncompressed_sz = len(chunk)
-        cchunk = self.compressor.compress(chunk)
+        cchunk: Union[bytes, memoryview] = self.compressor.compress(chunk)
         if is_last and not isinstance(self.compressor, IdentityCompressor):
-            cchunk += self.compressor.flush()
-        if is_last:
-            self.state = FileState.finished
-            if self.actual_file is not None:
-                self.actual_file.close()
-                self.actual_file = None
-        return cchunk, uncompressed_sz
-
-    def metadata_command(self, use_rsync: bool = False) -> FileTransmissionCommand:
+            tail = self.compressor.flush()
+            if tail:
+                cchunk = b''.join((cchunk, tail)) if cchunk else tail
+        if is_last and self.actual_file is not None:
+            self.actual_file.close()
+            self.actual_file = None
+            self.read_buf = None
+        return cchunk, uncompressed_sz, is_last
+
+    def metadata_command(self, use_rsync: bool = False, compression_level: int = 1) -> FileTransmissionCommand:
         self.ttype = TransmissionType.rsync if self.rsync_capable and use_rsync else TransmissionType.simple
-        self.compression = Compression.zlib if self.compression_capable else Compression.none
-        self.compressor: Union[ZlibCompressor, IdentityCompressor] = ZlibCompressor() if self.compression is Compression.zlib else IdentityCompressor()
+        self.compression = Compression.zlib if self.compression_capable and compression_level > 0 else Compression.none
+        self.compressor = IdentityCompressor()
+        if self.compression is Compression.zlib:
+            if self.ttype is TransmissionType.simple and self.file_size <= CHUNK_SIZE and has_libdeflate():
+                self.compressor = LibdeflateCompressor(compression_level)
+            else:
+                self.compressor = ZlibCompressor(compression_level)
+        # data is the last field and is omitted when empty, so the base64
+        # encoded payload can be appended directly to these
+        data_key = name_to_serialized_map()['data']
+        self.data_frame_prefix = f'{FileTransmissionCommand(action=Action.data, file_id=self.file_id).serialize()};{data_key}='
+        self.end_frame_prefix = f'{FileTransmissionCommand(action=Action.end_data, file_id=self.file_id).serialize()};{data_key}='
         return FileTransmissionCommand(
             action=Action.file, compression=self.compression, ftype=self.file_type,
             name=self.remote_path, permissions=self.permissions, mtime=self.mtime,
@@ -142,24 +197,48 @@ def metadata_command(self, use_rsync: bool = False) -> FileTransmissionCommand:
 
 
 def process(cli_opts: TransferCLIOptions, paths: Iterable[str], remote_base: str, counter: Iterator[int]) -> Iterator[File]:
+    # stat all the top level paths before yielding anything, so that bad
+    # arguments are reported as soon as the first file is requested
+    entries = []
     for x in paths:
         expanded = expand_home(x)
         try:
             s = os.stat(expanded, follow_symlinks=False)
         except OSError as err:
             raise SystemExit(f'Failed to stat {x} with error: {err}') from err
-        if stat.S_ISDIR(s.st_mode):
-            yield File(x, expanded, next(counter), s, remote_base, FileType.directory)
-            new_remote_base = remote_base
-            if new_remote_base:
-                new_remote_base = new_remote_base.rstrip('/') + '/' + os.path.basename(x) + '/'
-            else:
-                new_remote_base = x.replace(os.sep, '/').rstrip('/') + '/'
-            yield from process(cli_opts, [os.path.join(x, y) for y in os.listdir(expanded)], new_remote_base, counter)
-        elif stat.S_ISLNK(s.st_mode):
-            yield File(x, expanded, next(counter), s, remote_base, FileType.symlink)
-        elif stat.S_ISREG(s.st_mode):
-            yield File(x, expanded, next(counter), s, remote_base, FileType.regular)
+        entries.append((x, expanded, s))
+    for x, expanded, s in entries:
+        yield from process_entry(cli_opts, x, expanded, s, remote_base, counter)
+
+
+def process_entry(
+    cli_opts: TransferCLIOptions, x: str, expanded: str, s: os.stat_result, remote_base: str, counter: Iterator[int]
+) -> Iterator[File]:
+    if stat.S_ISDIR(s.st_mode):
+        yield File(x, expanded, next(counter), s, remote_base, FileType.directory)
+        new_remote_base = remote_base
+        if new_remote_base:
+            new_remote_base = new_remote_base.rstrip('/') + '/' + os.path.basename(x) + '/'
+        else:
+            new_remote_base = (x.replace(os.sep, '/') if NEEDS_SEP_NORMALIZATION else x).rstrip('/') + '/'
+        children = []
+        try:
+            with os.scandir(expanded) as it:
+                for entry in it:
+                    child = os.path.join(x, entry.name)
+                    try:
+                        cs = entry.stat(follow_symlinks=False)
+                    except OSError as err:
+                        raise SystemExit(f'Failed to stat {child} with error: {err}') from err
+                    children.append((child, entry.path, cs))
+        except OSError as err:
+            raise SystemExit(f'Failed to read directory {x} with error: {err}') from err
+        for child, child_expanded, cs in children:
+            yield from process_entry(cli_opts, child, child_expanded, cs, new_remote_base, counter)
+    elif stat.S_ISLNK(s.st_mode):
+        yield File(x, expanded, next(counter), s, remote_base, FileType.symlink)
+    elif stat.S_ISREG(s.st_mode):
+        yield File(x, expanded, next(counter), s, remote_base, FileType.regular)
 
 
 def process_mirrored_files(cli_opts: TransferCLIOptions, args: Sequence[str]) -> Iterator[File]:
@@ -178,53 +257,65 @@ def process_normal_files(cli_opts: TransferCLIOptions, args: Sequence[str]) -> I
     if len(args) < 2:
         raise SystemExit('Must specify at least one local path and one remote path')
     args = list(args)
-    remote_base = args.pop().replace(os.sep, '/')
+    remote_base = args.pop()
+    if NEEDS_SEP_NORMALIZATION:
+        remote_base = remote_base.replace(os.sep, '/')
     if len(args) > 1 and not remote_base.endswith('/'):
         remote_base += '/'
     paths = [abspath(x) for x in args]
     yield from process(cli_opts, paths, remote_base, count(1))
 
 
-def files_for_send(cli_opts: TransferCLIOptions, args: List[str]) -> Tuple[File, ...]:
+def iter_files_for_send(cli_opts: TransferCLIOptions, args: List[str]) -> Iterator[File]:
+    # Files are yielded as they are found. Symlink targets that are
+    # themselves being transferred can only be known once the scan is
+    # complete, so symbolic_link_target is updated after the last file has
+    # been yielded.
     if cli_opts.mode == 'mirror':
-        files = list(process_mirrored_files(cli_opts, args))
+        source = process_mirrored_files(cli_opts, args)
     else:
-        files = list(process_normal_files(cli_opts, args))
-    groups: Dict[Tuple[int, int], List[File]] = {}
-
-    # detect hard links
-    for f in files:
-        groups.setdefault(f.file_hash, []).append(f)
-    for group in groups.values():
-        if len(group) > 1:
-            for lf in group[1:]:
-                lf.file_type = FileType.link
-                lf.hard_link_target = group[0].file_id
-
-    # detect symlinks to other transferred files
-    for f in tuple(files):
-        if f.file_type is FileType.symlink:
+        source = process_normal_files(cli_opts, args)
+    file_by_hash: Dict[Tuple[int, int], File] = {}
+    # maps local paths of files that are not symlinks to their (st_dev, st_ino)
+    inode_cache: Dict[str, Tuple[int, int]] = {}
+    symlinks: List[Tuple[File, str]] = []
+
+    for f in source:
+        if f.file_type is not FileType.symlink:
+            inode_cache[f.local_path] = f.file_hash
+        # detect hard links
+        t = file_by_hash.setdefault(f.file_hash, f)
+        if t is not f:
+            f.file_type = FileType.link
+            f.hard_link_target = t.file_id
+        elif f.file_type is FileType.symlink:
             try:
                 link_dest = os.readlink(f.local_path)
             except OSError:
-                files.remove(f)
                 continue
             f.symbolic_link_target = f'path:{link_dest}'
-            is_abs = os.path.isabs(link_dest)
-            q = link_dest if is_abs else os.path.join(os.path.dirname(f.local_path), link_dest)
+            symlinks.append((f, link_dest))
+        yield f
+
+    # detect symlinks to other transferred files
+    for f, link_dest in symlinks:
+        is_abs = os.path.isabs(link_dest)
+        q = link_dest if is_abs else os.path.join(os.path.dirname(f.local_path), link_dest)
+        fh = inode_cache.get(q)
+        if fh is None:
             try:
                 st = os.stat(q)
             except OSError:
-                pass
-            else:
-                fh = st.st_dev, st.st_ino
-                if fh in groups:
-                    g = tuple(x for x in groups[fh] if os.path.samestat(st, x.stat_result))
-                    if g:
-                        t = g[0]
-                        prefix = 'fid_abs' if is_abs else 'fid'
-                        f.symbolic_link_target = f'{prefix}:{t.file_id}'
-    return tuple(files)
+                continue
+            fh = st.st_dev, st.st_ino
+        target = file_by_hash.get(fh)
+        if target is not None:
+            prefix = 'fid_abs' if is_abs else 'fid'
+            f.symbolic_link_target = f'{prefix}:{target.file_id}'
+
+
+def files_for_send(cli_opts: TransferCLIOptions, args: List[str]) -> Tuple[File, ...]:
+    return tuple(iter_files_for_send(cli_opts, args))
 
 
 class SendState(NameReprEnum):
@@ -236,9 +327,9 @@ class SendState(NameReprEnum):
 
 class Transfer:
 
-    def __init__(self, amt: int = 0):
+    def __init__(self, amt: int, at: float):
         self.amt = amt
-        self.at = monotonic()
+        self.at = at
 
     def is_too_old(self, now: float) -> bool:
         return now - self.at > 30
@@ -258,25 +349,29 @@ def __init__(self, total_size_of_all_files: int):
         self.signature_bytes = 0
         self.total_reported_progress = 0
 
+    def add_file(self, f: File) -> None:
+        self.total_size_of_all_files += f.file_size
+        self.total_bytes_to_transfer += f.file_size
+
     def change_active_file(self, nf: File) -> None:
         now = monotonic()
         self.active_file = nf
         nf.transmit_started_at = now
 
     def start_transfer(self) -> None:
-        self.transfers.append(Transfer())
         self.started_at = monotonic()
+        self.transfers.append(Transfer(0, self.started_at))
 
     def on_transmit(self, amt: int) -> None:
         if self.active_file is not None:
             self.active_file.transmitted_bytes += amt
         self.total_transferred += amt
-        self.transfers.append(Transfer(amt))
-        now = self.transfers[-1].at
+        now = monotonic()
+        self.transfers.append(Transfer(amt, now))
+        self.transfered_stats_amt += amt
         while len(self.transfers) > 2 and self.transfers[0].is_too_old(now):
-            self.transfers.popleft()
+            self.transfered_stats_amt -= self.transfers.popleft().amt
         self.transfered_stats_interval = now - self.transfers[0].at
-        self.transfered_stats_amt = sum(t.amt for t in self.transfers)
 
     def on_file_progress(self, af: File, delta: int) -> None:
         if delta > 0:
@@ -289,15 +384,19 @@ def on_file_done(self, af: File) -> None:
 class SendManager:
 
     def __init__(
-        self, request_id: str, files: Tuple[File, ...],
+        self, request_id: str, files: Iterable[File],
         bypass: Optional[str] = None, use_rsync: bool = False,
         file_progress: Callable[[File, int], None] = lambda f, i: None,
         file_done: Callable[[File], None] = lambda f: None,
+        compression_level: int = 1, scan_complete: bool = True,
     ):
         self.use_rsync = use_rsync
-        self.files = files
+        self.compression_level = compression_level
+        self.files: List[File] = []
         self.bypass = encode_bypass(request_id, bypass) if bypass else ''
-        self.fid_map = {f.file_id: f for f in self.files}
+        self.fid_map: Dict[str, File] = {}
+        self.idx_map: Dict[str, int] = {}
+        self.transmitting: Deque[int] = deque()
         self.request_id = request_id
         self.state = SendState.waiting_for_permission
         self.all_acknowledged = self.all_started = self.has_transmitting = self.has_rsync = False
@@ -305,10 +404,28 @@ def __init__(
         self.current_chunk_uncompressed_sz: Optional[int] = None
         self.prefix = f'\x1b]{FILE_TRANSFER_CODE};id={self.request_id};'
         self.suffix = '\x1b\\'
-        self.progress = ProgressTracker(sum(df.file_size for df in self.files if df.file_size >= 0))
+        self.progress = ProgressTracker(0)
         self.file_done = file_done
         self.file_progress = file_progress
         self.last_progress_file: Optional[File] = None
+        self.num_rsync = self.num_metadata_sent = 0
+        self.state_counts = {s: 0 for s in FileState}
+        # when False, more files will be added with add_file() until scan_finished() is called
+        self.scan_complete = scan_complete
+        for f in files:
+            self.add_file(f)
+
+    def add_file(self, f: File) -> None:
+        self.idx_map[f.file_id] = len(self.files)
+        self.files.append(f)
+        self.fid_map[f.file_id] = f
+        self.state_counts[f.state] += 1
+        if f.file_size >= 0:
+            self.progress.add_file(f)
+
+    def scan_finished(self) -> None:
+        self.scan_complete = True
+        self.update_collective_statuses()
 
     @property
     def active_file(self) -> Optional[File]:
@@ -322,7 +439,9 @@ def activate_next_ready_file(self) -> Optional[File]:
         if self.active_idx is not None:
             paf = self.files[self.active_idx]
             paf.transmit_ended_at = monotonic()
-        for i, f in enumerate(self.files):
+        while self.transmitting:
+            i = self.transmitting.popleft()
+            f = self.files[i]
             if f.state is FileState.transmitting:
                 self.active_idx = i
                 self.update_collective_statuses()
@@ -332,48 +451,68 @@ def activate_next_ready_file(self) -> Optional[File]:
         self.update_collective_statuses()
         return None
 
-    def update_collective_statuses(self) -> None:
-        found_not_started = found_not_done = False
-        has_rsync = has_transmitting = False
-        for f in self.files:
-            if f.state is not FileState.acknowledged:
-                found_not_done = True
-            if f.state is FileState.waiting_for_start:
-                found_not_started = True
-            elif f.state is FileState.transmitting:
-                has_transmitting = True
-            if f.ttype is TransmissionType.rsync:
-                has_rsync = True
+    def set_file_state(self, f: File, state: FileState) -> None:
+        self.state_counts[f.state] -= 1
+        self.state_counts[state] += 1
+        if state is FileState.transmitting and f.state is not FileState.transmitting:
+            self.transmitting.append(self.idx_map[f.file_id])
+        f.state = state
 
-        self.all_acknowledged = not found_not_done
-        self.all_started = not found_not_started
-        self.has_rsync = has_rsync
-        self.has_transmitting = has_transmitting
+    def update_collective_statuses(self) -> None:
+        counts = self.state_counts
+        self.all_acknowledged = self.scan_complete and counts[FileState.acknowledged] == len(self.files)
+        self.all_started = self.scan_complete and counts[FileState.waiting_for_start] == 0
+        self.has_rsync = self.num_rsync > 0
+        self.has_transmitting = counts[FileState.transmitting] > 0
 
     def start_transfer(self) -> str:
         return FileTransmissionCommand(action=Action.send, bypass=self.bypass).serialize()
 
-    def next_chunks(self) -> Iterator[str]:
+    def file_for_next_chunk(self) -> Optional[File]:
         if self.active_file is None:
             self.activate_next_ready_file()
-        af = self.active_file
-        if af is None:
-            return
-        chunk = b''
-        self.current_chunk_uncompressed_sz = 0
-        while af.state is not FileState.finished and not chunk:
-            chunk, usz = af.next_chunk()
-            self.current_chunk_uncompressed_sz += usz
-        is_last = af.state is FileState.finished
+        return self.active_file
+
+    def read_next_chunk(self, af: File) -> Tuple[Union[bytes, memoryview], int, bool]:
+        # Only touches the data source of af, so can be run in a worker thread
+        chunk: Union[bytes, memoryview] = b''
+        uncompressed_sz, is_last = 0, False
+        while not is_last and not chunk:
+            chunk, usz, is_last = af.next_chunk()
+            uncompressed_sz += usz
+        return chunk, uncompressed_sz, is_last
+
+    def next_chunks(self) -> Iterator[str]:
+        af = self.file_for_next_chunk()
+        if af is not None:
+            yield from self.frames_for_chunk(af, *self.read_next_chunk(af))
+
+    def frames_for_chunk(self, af: File, chunk: Union[bytes, memoryview], uncompressed_sz: int, is_last: bool) -> Iterator[str]:
+        self.current_chunk_uncompressed_sz = uncompressed_sz
+        if is_last:
+            self.set_file_state(af, FileState.finished)
+        return self.iter_frames(af, chunk, is_last)
+
+    def iter_frames(self, af: File, chunk: Union[bytes, memoryview], is_last: bool) -> Iterator[str]:
         if len(chunk):
-            for ftc in split_for_transfer(chunk, file_id=af.file_id, mark_last=is_last):
-                yield ftc.serialize()
+            encoded = standard_b64encode(chunk).decode('ascii')
+            limit = len(encoded)
+            data_prefix = af.data_frame_prefix
+            last_pos = limit - ENCODED_FRAME_SIZE if is_last else limit
+            for pos in range(0, limit, ENCODED_FRAME_SIZE):
+                prefix = af.end_frame_prefix if pos >= last_pos else data_prefix
+                yield prefix + encoded[pos:pos + ENCODED_FRAME_SIZE]
         elif is_last:
             yield FileTransmissionCommand(action=Action.end_data, file_id=af.file_id, data=b'').serialize()
 
     def send_file_metadata(self) -> Iterator[str]:
-        for f in self.files:
-            yield f.metadata_command(self.use_rsync).serialize()
+        # only metadata for files added since the last call is sent
+        start, self.num_metadata_sent = self.num_metadata_sent, len(self.files)
+        for f in islice(self.files, start, None):
+            ftc = f.metadata_command(self.use_rsync, self.compression_level)
+            if f.ttype is TransmissionType.rsync:
+                self.num_rsync += 1
+            yield ftc.serialize()
 
     def on_file_status_update(self, ftc: FileTransmissionCommand) -> None:
         file = self.fid_map.get(ftc.file_id)
@@ -383,9 +522,9 @@ def on_file_status_update(self, ftc: FileTransmissionCommand) -> None:
             file.remote_final_path = ftc.name
             file.remote_initial_size = ftc.size
             if file.file_type is FileType.directory:
-                file.state = FileState.finished
+                self.set_file_state(file, FileState.finished)
             else:
-                file.state = FileState.waiting_for_data if ftc.ttype is TransmissionType.rsync else FileState.transmitting
+                self.set_file_state(file, FileState.waiting_for_data if ftc.ttype is TransmissionType.rsync else FileState.transmitting)
                 if file.state is FileState.waiting_for_data:
                     file.signature_loader = LoadSignature()
             self.update_collective_statuses()
@@ -398,7 +537,7 @@ def on_file_status_update(self, ftc: FileTransmissionCommand) -> None:
         else:
             if ftc.name and not file.remote_final_path:
                 file.remote_final_path = ftc.name
-            file.state = FileState.acknowledged
+            self.set_file_state(file, FileState.acknowledged)
             if ftc.status == 'OK':
                 if ftc.size > 0:
                     change = ftc.size - file.reported_progress
@@ -424,6 +563,7 @@ def on_signature_data_received(self, ftc: FileTransmissionCommand) -> None:
         if ftc.action is Action.end_data:
             sl.commit()
             file.start_delta_calculation()
+            self.set_file_state(file, FileState.transmitting)
             self.update_collective_statuses()
 
     def on_file_transfer_response(self, ftc: FileTransmissionCommand) -> None:
@@ -440,17 +580,19 @@ def on_file_transfer_response(self, ftc: FileTransmissionCommand) -> None:
 class Send(Handler):
     use_alternate_screen = False
 
-    def __init__(self, cli_opts: TransferCLIOptions, files: Tuple[File, ...]):
+    def __init__(self, cli_opts: TransferCLIOptions, files: Iterable[File]):
         Handler.__init__(self)
         self.manager = SendManager(
-            random_id(), files, cli_opts.permissions_bypass, cli_opts.transmit_deltas, self.on_file_progress, self.on_file_done)
+            random_id(), (), cli_opts.permissions_bypass, cli_opts.transmit_deltas, self.on_file_progress, self.on_file_done,
+            cli_opts.compression_level, scan_complete=False)
+        self.file_source: Optional[Iterator[File]] = iter(files)
+        self.pending_symlinks: List[File] = []
         self.cli_opts = cli_opts
         self.transmit_started = False
-        self.file_metadata_sent = False
+        self.file_metadata_allowed = False
         self.quit_after_write_code: Optional[int] = None
         self.check_paths_printed = False
-        names = tuple(x.display_name for x in self.manager.files)
-        self.max_name_length = max(6, max(map(wcswidth, names)))
+        self.max_name_length = 6
         self.spinner = Spinner()
         self.progress_drawn = True
         self.done_files: List[File] = []
@@ -458,12 +600,54 @@ def __init__(self, cli_opts: TransferCLIOptions, files: Tuple[File, ...]):
         self.failed_files: List[File] = []
         self.transmit_ok_checked = False
         self.progress_update_call: Optional[TimerHandle] = None
+        self.pending_chunk: Optional['Future[Tuple[Union[bytes, memoryview], int, bool]]'] = None
+        self.pending_chunk_file: Optional[File] = None
 
     def send_payload(self, payload: str) -> None:
         self.write(self.manager.prefix)
         self.write(payload)
         self.write(self.manager.suffix)
 
+    def send_payloads(self, payloads: Iterable[str]) -> None:
+        prefix, suffix = self.manager.prefix, self.manager.suffix
+        data = ''.join(prefix + payload + suffix for payload in payloads)
+        if data:
+            self.write(data)
+
+    def add_file(self, f: File) -> None:
+        self.manager.add_file(f)
+        self.max_name_length = max(self.max_name_length, f.display_name_width)
+
+    def scan_files(self) -> None:
+        source = self.file_source
+        if source is None or self.quit_after_write_code is not None or self.manager.state is SendState.canceled:
+            return
+        try:
+            batch = tuple(islice(source, SCAN_BATCH_SIZE))
+        except SystemExit as err:
+            self.file_source = None
+            self.cmd.styled(str(err), fg='red')
+            self.print()
+            self.abort_transfer()
+            return
+        for f in batch:
+            # the targets of symlinks are only resolved once the scan is complete
+            if f.file_type is FileType.symlink:
+                self.pending_symlinks.append(f)
+            else:
+                self.add_file(f)
+        if len(batch) < SCAN_BATCH_SIZE:
+            self.file_source = None
+            for f in self.pending_symlinks:
+                self.add_file(f)
+            del self.pending_symlinks[:]
+            self.manager.scan_finished()
+        else:
+            self.asyncio_loop.call_soon(self.scan_files)
+        if self.file_metadata_allowed:
+            self.send_file_metadata()
+        self.asyncio_loop.call_soon(self.loop_tick)
+
     def on_file_transfer_response(self, ftc: FileTransmissionCommand) -> None:
         if ftc.id != self.manager.request_id:
             return
@@ -556,13 +740,43 @@ def check_for_transmit_ok(self) -> None:
         self.start_transfer()
 
     def transmit_next_chunk(self) -> None:
-        found_chunk = False
-        for chunk in self.manager.next_chunks():
-            self.send_payload(chunk)
-            found_chunk = True
-        if not found_chunk:
+        if self.manager.current_chunk_uncompressed_sz is not None:
+            # the previous chunk is still being written, on_writing_finished() will call us again
+            return
+        if self.pending_chunk is None and not self.start_reading_next_chunk():
+            return
+        fut, af = self.pending_chunk, self.pending_chunk_file
+        assert fut is not None and af is not None
+        if not fut.done():
+            # on_chunk_read() will call us again
+            return
+        self.pending_chunk = self.pending_chunk_file = None
+        chunk, uncompressed_sz, is_last = fut.result()
+        if af.state is not FileState.transmitting:
+            # the terminal reported a failure for this file while the chunk was being read
+            self.asyncio_loop.call_soon(self.loop_tick)
+            return
+        self.send_payloads(self.manager.frames_for_chunk(af, chunk, uncompressed_sz, is_last))
+        # the frames have been joined into the write buffer, so the next chunk
+        # can be read while this one is being written
+        self.start_reading_next_chunk()
+
+    def start_reading_next_chunk(self) -> bool:
+        af = self.manager.file_for_next_chunk()
+        if af is None:
             if self.manager.all_acknowledged:
                 self.transfer_finished()
+            return False
+        # reading and compressing is done in a worker thread so as not to block the UI
+        self.pending_chunk_file = af
+        self.pending_chunk = self.asyncio_loop.run_in_executor(None, self.manager.read_next_chunk, af)
+        self.pending_chunk.add_done_callback(self.on_chunk_read)
+        return True
+
+    def on_chunk_read(self, fut: 'Future[Tuple[Union[bytes, memoryview], int, bool]]') -> None:
+        if fut is not self.pending_chunk or self.quit_after_write_code is not None or self.manager.state is SendState.canceled:
+            return
+        self.transmit_next_chunk()
 
     def transfer_finished(self) -> None:
         self.send_payload(FileTransmissionCommand(action=Action.finish).serialize())
@@ -595,15 +809,14 @@ def initialize(self) -> None:
             # avoids a roundtrip
             self.send_file_metadata()
         self.cmd.set_cursor_visible(False)
+        self.asyncio_loop.call_soon(self.scan_files)
 
     def finalize(self) -> None:
         self.cmd.set_cursor_visible(True)
 
     def send_file_metadata(self) -> None:
-        if not self.file_metadata_sent:
-            for payload in self.manager.send_file_metadata():
-                self.send_payload(payload)
-            self.file_metadata_sent = True
+        self.file_metadata_allowed = True
+        self.send_payloads(self.manager.send_file_metadata())
 
     def on_term(self) -> None:
         if self.quit_after_write_code is not None:
@@ -629,14 +842,14 @@ def abort_transfer(self, delay: float = 5) -> None:
 
     def render_progress(
         self, name: str, spinner_char: str = ' ', bytes_so_far: int = 0, total_bytes: int = 0,
-        secs_so_far: float = 0., bytes_per_sec: float = 0., is_complete: bool = False
+        secs_so_far: float = 0., bytes_per_sec: float = 0., is_complete: bool = False, name_width: int = -1
     ) -> None:
         if is_complete:
             bytes_so_far = total_bytes
         self.write(render_progress_in_width(
             name, width=self.screen_size.cols, max_path_length=self.max_name_length, spinner_char=spinner_char,
             bytes_so_far=bytes_so_far, total_bytes=total_bytes, secs_so_far=secs_so_far,
-            bytes_per_sec=bytes_per_sec, is_complete=is_complete
+            bytes_per_sec=bytes_per_sec, is_complete=is_complete, path_width=name_width
         ))
 
     def erase_progress(self) -> None:
@@ -664,11 +877,12 @@ def on_file_done(self, file: File) -> None:
 
     @Handler.atomic_update
     def draw_progress(self) -> None:
+        now = monotonic()
         with without_line_wrap(self.write):
             for df in self.done_files:
                 sc = styled('✔', fg='green') if not df.err_msg else styled('✘', fg='red')
                 if df.file_type is FileType.regular:
-                    self.draw_progress_for_current_file(df, spinner_char=sc, is_complete=True)
+                    self.draw_progress_for_current_file(df, now, spinner_char=sc, is_complete=True)
                 else:
                     self.write(f'{sc} {df.display_name} {styled(df.file_type.name, dim=True, italic=True)}')
                 self.print()
@@ -680,7 +894,6 @@ def draw_progress(self) -> None:
             else:
                 sc = self.spinner()
             p = self.manager.progress
-            now = monotonic()
             if is_complete:
                 self.cmd.repeat('─', self.screen_size.width)
             else:
@@ -691,7 +904,7 @@ def draw_progress(self) -> None:
                     else:
                         self.print(sc, 'Transferring metadata...', end='')
                 else:
-                    self.draw_progress_for_current_file(af, spinner_char=sc)
+                    self.draw_progress_for_current_file(af, now, spinner_char=sc)
             self.print()
             if p.total_reported_progress > 0:
                 self.render_progress(
@@ -717,11 +930,10 @@ def refresh_progress(self) -> None:
         self.erase_progress()
         self.draw_progress()
 
-    def draw_progress_for_current_file(self, af: File, spinner_char: str = ' ', is_complete: bool = False) -> None:
+    def draw_progress_for_current_file(self, af: File, now: float, spinner_char: str = ' ', is_complete: bool = False) -> None:
         p = self.manager.progress
-        now = monotonic()
         self.render_progress(
-            af.display_name, spinner_char=spinner_char, is_complete=is_complete,
+            af.display_name, spinner_char=spinner_char, is_complete=is_complete, name_width=af.display_name_width,
             bytes_so_far=af.reported_progress, total_bytes=af.bytes_to_transmit,
             secs_so_far=(af.done_at or now) - af.transmit_started_at,
             bytes_per_sec=safe_divide(p.transfered_stats_amt, p.transfered_stats_interval)
@@ -729,16 +941,21 @@ def draw_progress_for_current_file(self, af: File, spinner_char: str = ' ', is_c
 
 
 def send_main(cli_opts: TransferCLIOptions, args: List[str]) -> None:
-    print('Scanning files…')
-    files = files_for_send(cli_opts, args)
-    print(f'Found {len(files)} files and directories, requesting transfer permission…')
+    print('Scanning files and requesting transfer permission…')
+    files = iter_files_for_send(cli_opts, args)
+    # validates the arguments and the top level paths before the transfer
+    # request is sent to the terminal, the rest of the tree is scanned while
+    # waiting for permission
+    first = next(files, None)
+    if first is None:
+        raise SystemExit('No files found to transfer')
     loop = Loop()
-    handler = Send(cli_opts, files)
+    handler = Send(cli_opts, chain((first,), files))
     loop.loop(handler)
     p = handler.manager.progress
     if handler.manager.has_rsync and p.total_transferred + p.signature_bytes:
         tsf = 0
-        for f in files:
+        for f in handler.manager.files:
             if f.ttype is TransmissionType.rsync:
                 tsf += f.file_size
         if tsf:
@@ -5,10 +5,12 @@
 import secrets
 from contextlib import contextmanager
 from datetime import timedelta
-from typing import Generator, Union
+from functools import lru_cache
+from typing import Callable, Generator, List, Optional, Union
 
 from kitty.fast_data_types import truncate_point_for_length, wcswidth
 from kitty.guess_mime_type import guess_type
+from kitty.types import run_once
 
 from ..tui.operations import styled
 from ..tui.progress import render_progress_bar
@@ -34,10 +36,12 @@ def reduce_to_single_grapheme(text: str) -> str:
     return text
 
 
-def render_path_in_width(path: str, width: int) -> str:
+def render_path_in_width(path: str, width: int, path_width: int = -1) -> str:
     if os.altsep:
         path = path.replace(os.altsep, os.sep)
-    if wcswidth(path) <= width:
+    if path_width < 0:
+        path_width = wcswidth(path)
+    if path_width <= width:
         return path
     parts = path.split(os.sep)
     reduced = os.sep.join(map(reduce_to_single_grapheme, parts[:-1]))
@@ -85,6 +89,7 @@ def render_progress_in_width(
     total_bytes: int = 50000,
     width: int = 80,
     is_complete: bool = False,
+    path_width: int = -1,
 ) -> str:
     unit_style = styled('|', dim=True)
     sep, trail = unit_style.split('|')
@@ -103,7 +108,7 @@ def render_progress_in_width(
     lft = f'{spinner_char} '
     max_space_for_path = width // 2 - wcswidth(lft)
     w = min(max_path_length, max_space_for_path)
-    p = lft + render_path_in_width(path, w)
+    p = lft + render_path_in_width(path, w, path_width)
     w += wcswidth(lft)
     p = ljust(p, w)
     q = f'{ratio}{trail}{styled(" @ ", fg="yellow")}{rate}{trail}'
@@ -117,11 +122,19 @@ def render_progress_in_width(
     return p + q
 
 
-def should_be_compressed(path: str) -> bool:
-    ext = path.rpartition(os.extsep)[-1].lower()
-    if ext in ('zip', 'odt', 'odp', 'pptx', 'docx', 'gz', 'bz2', 'xz', 'svgz'):
+incompressible_extensions = frozenset((
+    'zip', 'odt', 'odp', 'ods', 'pptx', 'docx', 'xlsx', 'epub', 'jar', 'apk', 'whl',
+    'gz', 'tgz', 'bz2', 'tbz2', 'xz', 'txz', 'lz', 'lz4', 'lzma', 'zst', '7z', 'rar', 'svgz',
+    'mp3', 'ogg', 'oga', 'opus', 'flac', 'm4a', 'aac',
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'heic', 'mp4', 'mkv', 'mov', 'webm', 'avi',
+))
+
+
+@lru_cache(maxsize=512)
+def extension_should_be_compressed(ext: str) -> bool:
+    if ext in incompressible_extensions:
         return False
-    mt = guess_type(path) or ''
+    mt = guess_type(f'file.{ext}') or ''
     if mt:
         if mt.endswith('+zip'):
             return False
@@ -132,6 +145,13 @@ def should_be_compressed(path: str) -> bool:
     return True
 
 
+def should_be_compressed(path: str) -> bool:
+    base, sep, ext = path.rpartition(os.extsep)
+    if not sep or '/' in ext or os.sep in ext:
+        return True
+    return extension_should_be_compressed(ext.lower())
+
+
 def abspath(path: str, use_home: bool = False) -> str:
     base = home_path() if use_home else (_cwd or os.getcwd())
     return os.path.normpath(os.path.join(base, path))
@@ -170,7 +190,7 @@ def set_paths(cwd: str = '', home: str = '') -> Generator[None, None, None]:
 
 class IdentityCompressor:
 
-    def compress(self, data: bytes) -> bytes:
+    def compress(self, data: Union[bytes, memoryview]) -> Union[bytes, memoryview]:
         return data
 
     def flush(self) -> bytes:
@@ -179,17 +199,53 @@ def flush(self) -> bytes:
 
 class ZlibCompressor:
 
-    def __init__(self) -> None:
+    def __init__(self, level: int = 1) -> None:
         import zlib
-        self.c = zlib.compressobj()
+        self.c = zlib.compressobj(level=level)
 
-    def compress(self, data: bytes) -> bytes:
+    def compress(self, data: Union[bytes, memoryview]) -> bytes:
         return self.c.compress(data)
 
     def flush(self) -> bytes:
         return self.c.flush()
 
 
+@run_once
+def libdeflate_zlib_compress() -> Optional[Callable[[bytes, int], bytes]]:
+    try:
+        from deflate import zlib_compress  # type: ignore
+    except ImportError:
+        return None
+    ans: Callable[[bytes, int], bytes] = zlib_compress
+    return ans
+
+
+def has_libdeflate() -> bool:
+    return libdeflate_zlib_compress() is not None
+
+
+class LibdeflateCompressor:
+    # libdeflate has no streaming API and independently compressed
+    # blocks cannot be concatenated into a single zlib stream, so buffer
+    # everything and compress it in one shot on flush(). Only suitable for
+    # data that fits in a single chunk.
+
+    def __init__(self, level: int = 1) -> None:
+        self.level = level
+        self.parts: List[bytes] = []
+
+    def compress(self, data: Union[bytes, memoryview]) -> bytes:
+        self.parts.append(bytes(data))
+        return b''
+
+    def flush(self) -> bytes:
+        zlib_compress = libdeflate_zlib_compress()
+        assert zlib_compress is not None
+        data = b''.join(self.parts)
+        self.parts = []
+        return zlib_compress(data, self.level)
+
+
 def print_rsync_stats(total_bytes: int, delta_bytes: int, signature_bytes: int) -> None:
     print('Rsync stats:')
     print(f'  Delta size: {human_size(delta_bytes)} Signature size: {human_size(signature_bytes)}')
@@ -577,7 +577,7 @@ def close(self) -> None:
         self.signature_loader = None
         self.delta_loader = None
 
-    def next_chunk(self, sz: int = 1024 * 1024) -> Tuple[bytes, int]:
+    def next_chunk(self, sz: int = 1024 * 1024) -> Tuple[Union[bytes, memoryview], int]:
         if self.target:
             self.transmitted = True
             data = self.target
@@ -599,7 +599,7 @@ def next_chunk(self, sz: int = 1024 * 1024) -> Tuple[bytes, int]:
         uncompressed_sz = len(data)
         cchunk = self.compressor.compress(data)
         if self.transmitted and not isinstance(self.compressor, IdentityCompressor):
-            cchunk += self.compressor.flush()
+            cchunk = b''.join((cchunk, self.compressor.flush()))
         if self.transmitted:
             self.close()
         return cchunk, uncompressed_sz
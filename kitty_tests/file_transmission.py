@@ -6,6 +6,7 @@
 import shutil
 import stat
 import tempfile
+import unittest
 import zlib
 from pathlib import Path
 
@@ -13,9 +14,18 @@
 from kittens.transfer.main import parse_transfer_args
 from kittens.transfer.receive import File, files_for_receive
 from kittens.transfer.rsync import decode_utf8_buffer, parse_ftc
-from kittens.transfer.send import files_for_send
-from kittens.transfer.utils import cwd_path, expand_home, home_path, set_paths
-from kitty.file_transmission import Action, Compression, FileTransmissionCommand, FileType, TransmissionType, ZlibDecompressor, iter_file_metadata
+from kittens.transfer.send import FileState, SendManager, files_for_send, iter_files_for_send
+from kittens.transfer.utils import LibdeflateCompressor, ZlibCompressor, cwd_path, expand_home, has_libdeflate, home_path, set_paths
+from kitty.file_transmission import (
+    Action,
+    Compression,
+    FileTransmissionCommand,
+    FileType,
+    TransmissionType,
+    ZlibDecompressor,
+    iter_file_metadata,
+    split_for_transfer,
+)
 from kitty.file_transmission import TestFileTransmission as FileTransmission
 
 from . import BaseTest
@@ -475,3 +485,117 @@ def tf(args, expected):
             files = gm(b / 'h', b / 'r', 'dest')
             self.ae(files[1].file_type, FileType.link)
             self.ae(files[1].hard_link_target, '1')
+
+    def test_streaming_send(self):
+        opts = parse_transfer_args([])[0]
+        b = Path(os.path.join(self.tdir, 'b'))
+        os.makedirs(b / 'd')
+        open(b / 'd' / 'r', 'w').close()
+        os.link(b / 'd' / 'r', b / 'd' / 'h')
+        os.symlink('r', b / 'd' / 's')
+        os.symlink(b / 'd' / 'r', b / 'd' / 'a')
+        os.symlink('missing', b / 'd' / 'm')
+        open(b / 'f', 'w').close()
+        os.symlink('f', b / 'g')
+
+        # symlink targets are only resolved once all files have been yielded
+        targets_when_yielded = {}
+        files = []
+        for f in iter_files_for_send(opts, [str(b / 'd'), '/dest']):
+            targets_when_yielded[os.path.basename(f.local_path)] = f.symbolic_link_target
+            files.append(f)
+        fmap = {os.path.basename(f.local_path): f for f in files}
+        self.ae(set(fmap), {'d', 'r', 'h', 's', 'a', 'm'})
+        for x in 'sam':
+            self.assertTrue(targets_when_yielded[x].startswith('path:'), targets_when_yielded[x])
+
+        # hard links point to the first file seen
+        first, second = sorted((fmap['r'], fmap['h']), key=files.index)
+        self.ae(first.file_type, FileType.regular)
+        self.ae(second.file_type, FileType.link)
+        self.ae(second.hard_link_target, first.file_id)
+
+        self.ae(fmap['s'].symbolic_link_target, f'fid:{first.file_id}')
+        self.ae(fmap['a'].symbolic_link_target, f'fid_abs:{first.file_id}')
+        # broken symlinks are sent as plain links
+        self.ae(fmap['m'].symbolic_link_target, 'path:missing')
+
+        # symlinks that can no longer be read are dropped
+        source = iter_files_for_send(opts, [str(b / 'f'), str(b / 'g'), '/dest'])
+        self.ae(os.path.basename(next(source).local_path), 'f')
+        os.remove(b / 'g')
+        self.ae(list(source), [])
+
+    def test_send_manager_incremental(self):
+        opts = parse_transfer_args([])[0]
+        for x in 'abc':
+            open(os.path.join(self.tdir, x), 'w').close()
+        files = files_for_send(opts, [os.path.join(self.tdir, x) for x in 'abc'] + ['/dest'])
+        self.ae(len(files), 3)
+
+        def fids(cmds):
+            return [FileTransmissionCommand.deserialize(x).file_id for x in cmds]
+
+        m = SendManager('test', files[:2], scan_complete=False)
+        self.ae(fids(m.send_file_metadata()), [files[0].file_id, files[1].file_id])
+        self.ae(fids(m.send_file_metadata()), [])
+        m.add_file(files[2])
+        self.ae(fids(m.send_file_metadata()), [files[2].file_id])
+        self.ae(len(m.files), 3)
+
+        # collective statuses are only final once the scan is complete
+        for f in files:
+            m.set_file_state(f, FileState.acknowledged)
+        m.update_collective_statuses()
+        self.assertFalse(m.all_acknowledged)
+        self.assertFalse(m.all_started)
+        m.scan_finished()
+        self.assertTrue(m.all_acknowledged)
+        self.assertTrue(m.all_started)
+
+    def test_send_frames(self):
+        opts = parse_transfer_args([])[0]
+        open(os.path.join(self.tdir, 'a'), 'w').close()
+        f = files_for_send(opts, [os.path.join(self.tdir, 'a'), '/dest'])[0]
+        f.metadata_command()
+        m = SendManager('test', (f,))
+
+        def t(data, is_last):
+            frames = list(m.iter_frames(f, data, is_last))
+            cmds = [FileTransmissionCommand.deserialize(x) for x in frames]
+            expected = list(split_for_transfer(data, file_id=f.file_id, mark_last=is_last))
+            for c in cmds:
+                self.ae(c.file_id, f.file_id)
+                self.assertLessEqual(len(c.data), 4096)
+            self.ae(b''.join(c.data for c in cmds), b''.join(c.data for c in expected))
+            self.ae([c.action for c in cmds[:-1]], [Action.data] * (len(cmds) - 1))
+            self.ae(cmds[-1].action, expected[-1].action)
+            # the hand built frames must match what serialize() produces
+            self.ae(frames, [FileTransmissionCommand(action=c.action, file_id=c.file_id, data=c.data).serialize() for c in cmds])
+
+        for sz in (1, 2, 3, 4, 4094, 4095, 4096, 4097, 3 * 4095, 3 * 4095 + 1, 10000, 100000):
+            data = os.urandom(sz)
+            t(data, False)
+            t(data, True)
+        frames = list(m.iter_frames(f, b'', True))
+        self.ae(len(frames), 1)
+        c = FileTransmissionCommand.deserialize(frames[0])
+        self.ae((c.action, c.file_id, c.data), (Action.end_data, f.file_id, b''))
+        self.ae(list(m.iter_frames(f, b'', False)), [])
+
+    def assertCompressorRoundtrip(self, compressor_type):
+        data = b''.join(os.urandom(64) * 16 for i in range(64))
+        for level in (1, 6, 9):
+            c = compressor_type(level)
+            parts = [c.compress(data[:1000]), c.compress(memoryview(data)[1000:30000]), c.compress(data[30000:]), c.flush()]
+            d = ZlibDecompressor()
+            out = b''.join(d(p) for p in parts[:-1]) + d(parts[-1], is_last=True)
+            self.ae(out, data)
+            self.assertLess(sum(map(len, parts)), len(data))
+
+    def test_zlib_compressor(self):
+        self.assertCompressorRoundtrip(ZlibCompressor)
+
+    @unittest.skipUnless(has_libdeflate(), 'the deflate module is not installed')
+    def test_libdeflate_compressor(self):
+        self.assertCompressorRoundtrip(LibdeflateCompressor)